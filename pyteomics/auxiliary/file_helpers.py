@@ -2,6 +2,7 @@ import sys
 import codecs
 import re
 from functools import wraps
+from operator import itemgetter
 from contextlib import contextmanager
 from collections import OrderedDict, defaultdict
 import json
@@ -402,7 +403,7 @@ class IndexedTextReader(IndexedReaderMixin, FileReader):
                 setattr(self, attr, kwargs.pop(attr))
         self._offset_index = None
         if not kwargs.pop('_skip_index', False):
-            self._offset_index = self.build_byte_index()
+            self._build_index()
 
     def __getstate__(self):
         state = super(IndexedTextReader, self).__getstate__()
@@ -459,6 +460,9 @@ class IndexedTextReader(IndexedReaderMixin, FileReader):
             i += len(chunk)
         yield i, None, None
 
+    def _build_index(self):
+        self._offset_index = self.build_byte_index()
+
     def build_byte_index(self):
         index = OffsetIndex()
         g = self._generate_offsets()
@@ -481,6 +485,19 @@ class IndexedTextReader(IndexedReaderMixin, FileReader):
 class IndexSavingMixin(NoOpBaseReader):
     """Common interface for :py:class:`IndexSavingXML` and :py:class:`IndexSavingTextReader`."""
     _index_class = NotImplemented
+    _use_index_cache = False
+
+    def __init__(self, *args, **kwargs):
+        """
+        Parameters
+        ----------
+        use_index_cache : bool, keyword only, optional
+            If :py:const:`True`, write the byte offset index to :attr:`_byte_offset_filename`
+            whenever it has to be built by parsing the file, so that it can be reused when the file
+            is opened again. Default is :py:const:`False`.
+        """
+        self._use_index_cache = kwargs.pop('use_index_cache', False)
+        super(IndexSavingMixin, self).__init__(*args, **kwargs)
 
     @property
     def _byte_offset_filename(self):
@@ -505,6 +522,19 @@ class IndexSavingMixin(NoOpBaseReader):
             return False
         return os.path.exists(path)
 
+    def _check_byte_offset_file_is_outdated(self):
+        """Check if the source file has been modified after the file at
+        :attr:`_byte_offset_filename` was written
+
+        Returns
+        -------
+        bool
+        """
+        try:
+            return os.path.getmtime(self._source.name) > os.path.getmtime(self._byte_offset_filename)
+        except (AttributeError, TypeError, EnvironmentError):
+            return False
+
     @classmethod
     def prebuild_byte_offset_file(cls, path):
         """Construct a new XML reader, build its byte offset index and
@@ -534,9 +564,16 @@ class IndexSavingMixin(NoOpBaseReader):
         """
         if not self._use_index: return
         try:
+            if self._check_byte_offset_file_is_outdated():
+                raise IOError('Byte offset file is older than the source file')
             self._read_byte_offsets()
         except (IOError, AttributeError, TypeError):
             super(IndexSavingMixin, self)._build_index()
+            if self._use_index_cache and self._byte_offset_filename is not None:
+                try:
+                    self.write_byte_offsets()
+                except EnvironmentError as e:
+                    warnings.warn('Could not save the byte offset index: {}'.format(e))
 
     def _read_byte_offsets(self):
         """Read the byte offset index JSON file at :attr:`_byte_offset_filename`
@@ -544,6 +581,8 @@ class IndexSavingMixin(NoOpBaseReader):
         """
         with open(self._byte_offset_filename, 'r') as f:
             index = self._index_class.load(f)
+            if index.schema_version is None:
+                raise TypeError("Legacy Offset Index!")
             self._offset_index = index
 
 
@@ -600,7 +639,7 @@ class WritableIndex(object):
 
     @classmethod
     def load(cls, fp):
-        container = json.load(fp, object_hook=OrderedDict)
+        container = json.load(fp, object_pairs_hook=OrderedDict)
         version_tag = container.get(cls._schema_version_tag_key)
         if version_tag is None:
             # The legacy case, no special processing yet
@@ -644,8 +683,9 @@ class OffsetIndex(OrderedDict, WritableIndex):
         return self._index_sequence
 
     def __setitem__(self, key, value):
-        self._invalidate()
-        return super(OffsetIndex, self).__setitem__(key, value)
+        # called for every entry when an index is built, so avoid super()
+        self._index_sequence = None
+        return OrderedDict.__setitem__(self, key, value)
 
     def pop(self, *args, **kwargs):
         self._invalidate()
@@ -734,7 +774,7 @@ class OffsetIndex(OrderedDict, WritableIndex):
         return indices == sorted_indices
 
     def sort(self):
-        sorted_pairs = sorted(self.items(), key=lambda x: x[1])
+        sorted_pairs = sorted(self.items(), key=itemgetter(1))
         self.clear()
         self._invalidate()
         for key, value in sorted_pairs:
@@ -744,6 +784,7 @@ class OffsetIndex(OrderedDict, WritableIndex):
 
 class IndexSavingTextReader(IndexSavingMixin, IndexedTextReader):
     _index_class = OffsetIndex
+    _use_index = True
 
 
 class HierarchicalOffsetIndex(WritableIndex):
@@ -1,6 +1,6 @@
 from __future__ import print_function
 
-import base64
+import binascii
 import zlib
 from functools import wraps
 from collections import namedtuple
@@ -21,6 +21,16 @@ try:
 except ImportError:
     pynumpress = None
 
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+try:
+    import pybase64
+except ImportError:
+    pybase64 = None
+
 def print_tree(d, indent_str=' -> ', indent_count=1):
     """Read a nested dict (with strings as keys) and print its structure.
     """
@@ -62,6 +72,14 @@ def memoize(maxsize=1000):
     return deco
 
 
+def _base64_decode(source):
+    """Decode a base64-encoded string. :py:mod:`pybase64` is used if available,
+    in which case the result is a :py:class:`bytearray`."""
+    if pybase64 is not None:
+        return pybase64.b64decode_as_bytearray(source)
+    return binascii.a2b_base64(source)
+
+
 def _decode_base64_data_array(source, dtype, is_compressed):
     """Read a base64-encoded binary array.
 
@@ -79,26 +97,69 @@ def _decode_base64_data_array(source, dtype, is_compressed):
     out : numpy.array
     """
 
-    decoded_source = base64.b64decode(source.encode('ascii'))
+    decoded_source = _base64_decode(source)
     if is_compressed:
         decoded_source = zlib.decompress(decoded_source)
-    output = np.frombuffer(bytearray(decoded_source), dtype=dtype)
+    if not isinstance(decoded_source, bytearray):
+        decoded_source = bytearray(decoded_source)
+    output = np.frombuffer(decoded_source, dtype=dtype)
     return output
 
 
+def _accepts_hints(func):
+    """Mark a decompression function as accepting the `size` and `verify` hints.
+    Unmarked functions in :py:attr:`BinaryDataArrayTransformer.compression_type_map`
+    are called with the compressed data only."""
+    func.accepts_hints = True
+    return func
+
+
+@_accepts_hints
+def _zlib_decompress(data, size=None, verify=True):
+    """Decompress zlib-compressed `data`. If the size of the decompressed data
+    is known and :py:mod:`deflate` is installed, use libdeflate, which is faster
+    than :py:func:`zlib.decompress` on small buffers.
+
+    If `verify` is :py:const:`False`, the zlib header and the Adler-32 checksum are
+    skipped and the raw DEFLATE stream is decompressed without verification."""
+    if not verify:
+        # 2-byte zlib header, DEFLATE stream, 4-byte Adler-32 checksum
+        stream = bytes(data[2:-4])
+        if deflate is not None and size:
+            try:
+                return deflate.deflate_decompress(stream, size)
+            except deflate.DeflateError:
+                pass
+        return zlib.decompress(stream, -zlib.MAX_WBITS)
+    if deflate is not None and size:
+        try:
+            return deflate.zlib_decompress(data, size)
+        except deflate.DeflateError:
+            pass
+    return zlib.decompress(data)
+
+
+@_accepts_hints
+def _no_decompress(data, size=None, verify=True):
+    return data
+
+
 _default_compression_map = {
-        'no compression': lambda x: x,
-        'zlib compression': zlib.decompress,
+        'no compression': _no_decompress,
+        'zlib compression': _zlib_decompress,
     }
 
 def _pynumpressDecompress(decoder):
-    def decode(data):
+    @_accepts_hints
+    def decode(data, size=None, verify=True):
         return decoder(np.frombuffer(data, dtype=np.uint8))
     return decode
 
 def _zlibNumpress(decoder):
-    def decode(data):
-        return decoder(np.frombuffer(zlib.decompress(data), dtype=np.uint8))
+    @_accepts_hints
+    def decode(data, size=None, verify=True):
+        # `size` refers to the decoded array, not to the numpress stream
+        return decoder(np.frombuffer(_zlib_decompress(data, verify=verify), dtype=np.uint8))
     return decode
 
 if pynumpress:
@@ -120,17 +181,30 @@ if np is not None:
         Attributes
         ----------
         compression_type_map : dict
-            Maps compressor type name to decompression function
+            Maps compressor type name to decompression function. The functions
+            are called with the compressed data. Functions with a true `accepts_hints`
+            attribute also get the expected size of the decompressed data in bytes
+            (or :py:const:`None`) and :py:attr:`verify_checksums`.
+        verify_checksums : bool
+            Whether to verify the Adler-32 checksums of zlib-compressed arrays
         """
 
         compression_type_map = _default_compression_map
+        verify_checksums = True
 
         class binary_array_record(namedtuple(
-                "binary_array_record", ("data", "compression", "dtype", "source", "key"))):
+                "binary_array_record", ("data", "compression", "dtype", "source", "key", "array_length"))):
             """Hold all of the information about a base64 encoded array needed to
             decode the array.
+
+            The array is only decoded when :py:meth:`decode` is called or the record
+            is converted with :py:func:`numpy.asarray`.
             """
 
+            def __new__(cls, data, compression, dtype, source, key, array_length=None):
+                return super(BinaryDataArrayTransformer.binary_array_record, cls).__new__(
+                    cls, data, compression, dtype, source, key, array_length)
+
             def decode(self):
                 """Decode :attr:`data` into a numerical array
 
@@ -140,26 +214,37 @@ if np is not None:
                 """
                 return self.source._decode_record(self)
 
-        def _make_record(self, data, compression, dtype, key=None):
-            return self.binary_array_record(data, compression, dtype, self, key)
+            def __array__(self, dtype=None, copy=None):
+                array = self.decode()
+                if dtype is not None:
+                    array = array.astype(dtype, copy=False)
+                return array
+
+        def _make_record(self, data, compression, dtype, key=None, array_length=None):
+            return self.binary_array_record(data, compression, dtype, self, key, array_length)
 
         def _decode_record(self, record):
             array = self.decode_data_array(
-                record.data, record.compression, record.dtype)
+                record.data, record.compression, record.dtype, record.array_length)
             return self._finalize_record_conversion(array, record)
 
         def _finalize_record_conversion(self, array, record):
             return array
 
         def _base64_decode(self, source):
-            decoded_source = base64.b64decode(source.encode('ascii'))
+            # with pybase64, this is a bytearray that can back a writable array
+            # without another copy
+            decoded_source = _base64_decode(source)
             return decoded_source
 
-        def _decompress(self, source, compression_type=None):
+        def _decompress(self, source, compression_type=None, size=None):
             if compression_type is None:
                 return source
             decompressor = self.compression_type_map.get(compression_type)
-            decompressed_source = decompressor(source)
+            if getattr(decompressor, 'accepts_hints', False):
+                decompressed_source = decompressor(source, size, self.verify_checksums)
+            else:
+                decompressed_source = decompressor(source)
             return decompressed_source
 
         def _transform_buffer(self, binary, dtype):
@@ -167,7 +252,7 @@ if np is not None:
                 return binary.astype(dtype, copy=False)
             return np.frombuffer(binary, dtype=dtype)
 
-        def decode_data_array(self, source, compression_type=None, dtype=np.float64):
+        def decode_data_array(self, source, compression_type=None, dtype=np.float64, array_length=None):
             """Decode a base64-encoded, compressed bytestring into a numerical
             array.
 
@@ -182,13 +267,19 @@ if np is not None:
             dtype : type, optional
                 The data type to use to decode the binary array from the
                 decompressed bytes.
+            array_length : int, optional
+                The number of elements in the array, if known. It is used to
+                preallocate the output of decompression.
 
             Returns
             -------
             np.ndarray
             """
             binary = self._base64_decode(source)
-            binary = self._decompress(binary, compression_type)
+            size = None
+            if array_length is not None:
+                size = array_length * np.dtype(dtype).itemsize
+            binary = self._decompress(binary, compression_type, size)
             if isinstance(binary, bytes):
                 binary = bytearray(binary)
             array = self._transform_buffer(binary, dtype)
@@ -66,10 +66,13 @@ This module requires :py:mod:`lxml` and :py:mod:`numpy`.
 #   limitations under the License.
 
 import re
+import mmap
 import warnings
+from collections import deque
+from operator import itemgetter, le
+from multiprocessing.pool import ThreadPool
 import numpy as np
 from . import xml, auxiliary as aux, _schema_defaults
-from .xml import etree
 
 NON_STANDARD_DATA_ARRAY = 'non-standard data array'
 
@@ -89,6 +92,14 @@ STANDARD_ARRAYS = set([
     'baseline array'
 ])
 
+ARRAY_DTYPES = {
+    '32-bit float': np.float32,
+    '64-bit float': np.float64,
+    '32-bit integer': np.int32,
+    '64-bit integer': np.int64,
+    'null-terminated ASCII string': np.uint8
+}
+
 
 class MzML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.MultiProcessingXML, xml.IndexSavingXML):
     """Parser class for mzML files."""
@@ -102,16 +113,22 @@ class MzML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.Mult
 
     def __init__(self, *args, **kwargs):
         self.decode_binary = kwargs.pop('decode_binary', True)
+        self.decode_workers = kwargs.pop('decode_workers', 0)
+        self.verify_checksums = kwargs.pop('verify_checksums', True)
         super(MzML, self).__init__(*args, **kwargs)
 
     def __getstate__(self):
         state = super(MzML, self).__getstate__()
         state['decode_binary'] = self.decode_binary
+        state['decode_workers'] = self.decode_workers
+        state['verify_checksums'] = self.verify_checksums
         return state
 
     def __setstate__(self, state):
         super(MzML, self).__setstate__(state)
         self.decode_binary = state['decode_binary']
+        self.decode_workers = state.get('decode_workers', 0)
+        self.verify_checksums = state.get('verify_checksums', True)
 
     def _detect_array_name(self, info):
         """Determine what the appropriate name for this
@@ -189,50 +206,72 @@ class MzML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.Mult
 
     def _determine_array_dtype(self, info):
         dtype = None
-        types = {'32-bit float': np.float32, '64-bit float': np.float64,
-                 '32-bit integer': np.int32, '64-bit integer': np.int64,
-                 'null-terminated ASCII string': np.uint8}
-        for t, code in types.items():
+        for t, code in ARRAY_DTYPES.items():
             if t in info:
                 dtype = code
                 del info[t]
                 break
         # sometimes it's under 'name'
         else:
-            if 'name' in info:
-                for t, code in types.items():
-                    if t in info['name']:
+            name = info.get('name')
+            if isinstance(name, list):
+                for t, code in ARRAY_DTYPES.items():
+                    if t in name:
                         dtype = code
-                        info['name'].remove(t)
+                        name.remove(t)
                         break
+            elif name in ARRAY_DTYPES:
+                dtype = ARRAY_DTYPES[name]
+                del info['name']
         return dtype
 
     def _determine_compression(self, info):
-        known_compression_types = set(self.compression_type_map)
-        found_compression_types = known_compression_types & set(info)
+        found_compression_types = tuple(t for t in self.compression_type_map if t in info)
         if found_compression_types:
-            found_compression_types = tuple(found_compression_types)
             if len(found_compression_types) == 1:
                 del info[found_compression_types[0]]
                 return found_compression_types[0]
             warnings.warn("Multiple options for binary array compression: %r" % (
                 found_compression_types,))
             return found_compression_types[0]
-        elif "name" in info:
-            found_compression_types = known_compression_types & set(info['name'])
+        name = info.get('name')
+        if isinstance(name, aux.basestring):
+            if name in self.compression_type_map:
+                del info['name']
+                return name
+        elif isinstance(name, list):
+            found_compression_types = tuple(t for t in self.compression_type_map if t in name)
             if found_compression_types:
-                found_compression_types = tuple(found_compression_types)
                 if len(found_compression_types) == 1:
-                    del info['name'][found_compression_types[0]]
+                    name.remove(found_compression_types[0])
                     return found_compression_types[0]
                 else:
                     warnings.warn("Multiple options for binary array compression: %r" % (
                         found_compression_types,))
                     return found_compression_types[0]
-        else:
-            return 'no compression'
+        return 'no compression'
 
-    def _handle_binary(self, info, **kwargs):
+    def _determine_array_length(self, element, info):
+        """Find the number of elements in a binary data array. It is given either
+        by the `arrayLength` attribute of the ``<binaryDataArray>`` itself or by
+        the `defaultArrayLength` attribute of the enclosing spectrum or chromatogram.
+
+        Returns
+        -------
+        out : int or None
+        """
+        length = info.get('arrayLength')
+        if length is None:
+            parent = element.getparent()
+            if parent is not None:
+                parent = parent.getparent()
+            if parent is not None:
+                length = parent.get('defaultArrayLength')
+        if length is None:
+            return None
+        return int(length)
+
+    def _handle_binary(self, info, array_length=None, **kwargs):
         """Special handling when processing and flattening
         a <binary> tag and its sibling *Param tags.
 
@@ -240,6 +279,8 @@ class MzML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.Mult
         ----------
         info : dict
             Unprocessed binary array data and metadata
+        array_length : int, optional
+            The number of elements in the array, if known.
 
         Returns
         -------
@@ -251,42 +292,79 @@ class MzML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.Mult
         name = self._detect_array_name(info)
         binary = info.pop('binary')
         if not self.decode_binary:
-            info[name] = self._make_record(binary, compressed, dtype, name)
+            info[name] = self._make_record(binary, compressed, dtype, name, array_length)
             return info
 
-        if binary:
-            array = self.decode_data_array(binary, compressed, dtype)
+        if kwargs.get('defer_decoding'):
+            array = self._make_record(binary, compressed, dtype, name, array_length)
         else:
-            array = np.array([], dtype=dtype)
-
+            array = self._decode_binary_array(binary, compressed, dtype, array_length)
+            array = self._convert_array(None if name == 'binary' else name, array)
         if name == 'binary':
-            info[name] = self._convert_array(None, array)
+            info[name] = array
         else:
-            info = {name: self._convert_array(name, array)}
+            info = {name: array}
         return info
 
-    def _get_info_smart(self, element, **kw):
-        name = xml._local_name(element)
-        kwargs = dict(kw)
-        rec = kwargs.pop('recursive', None)
-        if name in {'indexedmzML', 'mzML'}:
-            info = self._get_info(element,
-                    recursive=(rec if rec is not None else False),
-                    **kwargs)
-        else:
-            info = self._get_info(element,
-                    recursive=(rec if rec is not None else True),
-                    **kwargs)
-        if 'binary' in info and isinstance(info, dict):
-            info = self._handle_binary(info, **kwargs)
+    def _decode_binary_array(self, binary, compressed, dtype, array_length=None):
+        if binary:
+            return self.decode_data_array(binary, compressed, dtype, array_length)
+        return np.array([], dtype=dtype)
+
+    def _decode_deferred_arrays(self, info):
+        """Decode the array records left in `info` by :py:meth:`_handle_binary`
+        when it is called with ``defer_decoding=True``, including those in nested
+        elements (e.g. spectra within a ``<run>``)."""
+        for key, value in info.items():
+            if isinstance(value, self.binary_array_record):
+                array = self._decode_binary_array(
+                    value.data, value.compression, value.dtype, value.array_length)
+                info[key] = self._convert_array(None if key == 'binary' else key, array)
+            elif isinstance(value, dict):
+                self._decode_deferred_arrays(value)
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, dict):
+                        self._decode_deferred_arrays(item)
+        return info
 
-        if 'binaryDataArray' in info and isinstance(info, dict):
+    def _iterfind_impl(self, path, **kwargs):
+        if self.decode_workers and self.decode_binary:
+            return self._iterfind_decode_threaded(path, **kwargs)
+        return super(MzML, self)._iterfind_impl(path, **kwargs)
+
+    def _iterfind_decode_threaded(self, path, **kwargs):
+        # Parsing has to stay sequential, but base64 and zlib decoding can be
+        # handed to worker threads while the parser moves on to the next spectra.
+        items = super(MzML, self)._iterfind_impl(path, defer_decoding=True, **kwargs)
+        pool = ThreadPool(self.decode_workers)
+        pending = deque()
+        try:
+            for info in items:
+                pending.append(pool.apply_async(self._decode_deferred_arrays, (info,)))
+                if len(pending) > 2 * self.decode_workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+
+    def _get_info_smart(self, element, **kwargs):
+        # This is called for every element of every spectrum, so avoid
+        # redundant copies and checks. `kwargs` is already a fresh dict.
+        rec = kwargs.pop('recursive', None)
+        if rec is None:
+            rec = xml._local_name(element) not in {'indexedmzML', 'mzML'}
+        info = self._get_info(element, recursive=rec, **kwargs)
+        if not isinstance(info, dict):
+            return info
+        if 'binary' in info:
+            info = self._handle_binary(info, self._determine_array_length(element, info), **kwargs)
+        if 'binaryDataArray' in info:
             for array in info.pop('binaryDataArray'):
                 info.update(array)
-        intkeys = {'ms level'}
-        for k in intkeys:
-            if k in info:
-                info[k] = int(info[k])
+        if 'ms level' in info:
+            info['ms level'] = int(info['ms level'])
         return info
 
     def _retrieve_refs(self, info, **kwargs):
@@ -306,8 +384,57 @@ class MzML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.Mult
     def _get_time(scan):
         return scan['scanList']['scan'][0]['scan start time']
 
+    def load_as_arrays(self, indices=None):
+        """Read several spectra into flat arrays, one value or one
+        stretch of peaks per spectrum.
+
+        Parameters
+        ----------
+        indices : iterable, optional
+            Spectrum indexes or IDs to read. By default, all spectra are read.
 
-def read(source, read_schema=False, iterative=True, use_index=False, dtype=None, huge_tree=False):
+        Returns
+        -------
+        out : dict
+            ``'m/z array'`` and ``'intensity array'`` are the concatenated arrays of all spectra.
+            The peaks of the i-th spectrum are at ``out['offsets'][i]:out['offsets'][i + 1]``.
+            ``'ms level'`` and ``'scan start time'`` hold one value per spectrum
+            (0 and NaN if missing, respectively).
+        """
+        if indices is None:
+            spectra = self.iterfind(self._default_iter_tag)
+        else:
+            spectra = (self[i] for i in indices)
+        keys = ['m/z array', 'intensity array']
+        arrays = {k: [] for k in keys}
+        lengths, ms_levels, times = [0], [], []
+        for spectrum in spectra:
+            # np.asarray also decodes the arrays if `decode_binary` is False
+            mz, intensity = [np.asarray(spectrum[k]) if k in spectrum else None for k in keys]
+            length = 0 if mz is None else mz.size
+            if length != (0 if intensity is None else intensity.size):
+                raise aux.PyteomicsError(
+                    'm/z and intensity arrays of spectrum {} have different lengths.'.format(spectrum.get('id')))
+            for k, array in zip(keys, (mz, intensity)):
+                if length:
+                    arrays[k].append(array)
+            lengths.append(length)
+            ms_levels.append(spectrum.get('ms level', 0))
+            try:
+                times.append(self._get_time(spectrum))
+            except (KeyError, IndexError):
+                times.append(np.nan)
+        out = {}
+        for k, v in arrays.items():
+            out[k] = np.concatenate(v) if v else np.empty(0, dtype=self._dtype_dict.get(k) or np.float64)
+        out['offsets'] = np.cumsum(lengths, dtype=np.int64)
+        out['ms level'] = np.array(ms_levels, dtype=np.int8)
+        out['scan start time'] = np.array(times, dtype=np.float32)
+        return out
+
+
+def read(source, read_schema=False, iterative=True, use_index=False, dtype=None, huge_tree=False, decode_binary=True,
+        decode_workers=0):
     """Parse `source` and iterate through spectra.
 
     Parameters
@@ -339,6 +466,11 @@ def read(source, read_schema=False, iterative=True, use_index=False, dtype=None,
         (under "m/z array", "intensity array", etc.).
         Default is :py:const:`True`.
 
+    decode_workers : int, optional
+        Number of threads used to decode binary arrays while iterating.
+        The XML is still parsed sequentially and spectra are returned in file order.
+        Default is 0 (decode in the calling thread).
+
     huge_tree : bool, optional
         This option is passed to the `lxml` parser and defines whether
         security checks for XML tree depth and node size should be disabled.
@@ -353,7 +485,8 @@ def read(source, read_schema=False, iterative=True, use_index=False, dtype=None,
     """
 
     return MzML(source, read_schema=read_schema, iterative=iterative,
-        use_index=use_index, dtype=dtype, huge_tree=huge_tree)
+        use_index=use_index, dtype=dtype, huge_tree=huge_tree, decode_binary=decode_binary,
+        decode_workers=decode_workers)
 
 def iterfind(source, path, **kwargs):
     """Parse `source` and yield info on elements with specified local
@@ -417,6 +550,11 @@ class PreIndexedMzML(MzML):
     """Parser class for mzML files, subclass of :py:class:`MzML`.
     Uses byte offsets listed at the end of the file for quick access to spectrum elements.
     """
+    _index_list_offset_pattern = re.compile(br'<indexListOffset>(\d+)</indexListOffset>')
+    _index_list_offset_search_size = 8192
+    _index_name_pattern = re.compile(r'<index\s[^>]*?\bname=(["\'])(.*?)\1')
+    _offset_pattern = re.compile(r'<offset\s[^>]*?\bidRef=(?:"([^"]*)"|\'([^\']*)\')[^>]*>\s*(\d+)')
+
     def _build_index(self):
         """
         Build up a `dict` of `dict` of offsets for elements. Calls :meth:`_find_index_list`
@@ -429,41 +567,92 @@ class PreIndexedMzML(MzML):
             warnings.warn('Could not extract the embedded offset index. Falling back to default indexing procedure.')
             super(PreIndexedMzML, self)._build_index()
 
+    def _map_source(self):
+        """
+        Memory-map the underlying file for reading.
+
+        Returns
+        -------
+        mmap.mmap or None
+            :py:const:`None` if the source is not backed by a file descriptor.
+        """
+        try:
+            return mmap.mmap(self._source.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, ValueError, EnvironmentError):
+            return None
+
     @xml._keepstate
-    def _iterparse_index_list(self, offset):
+    def _read_index_list(self, offset, mapped=None):
+        """
+        Read the ``<indexList>`` element starting at `offset`.
+
+        Parameters
+        ----------
+        offset : int
+            The byte offset of the ``<indexList>`` element.
+        mapped : mmap.mmap, optional
+            The memory-mapped file. If not given, the file is read directly.
+
+        Returns
+        -------
+        HierarchicalOffsetIndex
+        """
         index_map = xml.HierarchicalOffsetIndex()
-        index = index_map._inner_type()
-        self._source.seek(offset)
-        try:
-            for event, elem in etree.iterparse(self._source, events=('start', 'end'), remove_comments=True):
-                if event == 'start':
-                    if elem.tag == 'index':
-                        index = {}
-                        index_map[elem.attrib['name']] = index
-                else:
-                    if elem.tag == 'offset':
-                        index[elem.attrib['idRef']] = int(elem.text)
-                    elem.clear()
-        except etree.XMLSyntaxError:
-            # The iteration has reached the end of the indexList tag and the parser
-            # encounters the later elements in the document.
-            pass
+        if mapped is not None:
+            text, start = mapped, offset
+        else:
+            self._source.seek(offset)
+            text, start = self._source.read(), 0
+        end = text.find(b'</indexList>', start)
+        if end == -1:
+            return index_map
+        text = text[start:end].decode('utf-8')
+        has_entities = '&' in text
+        # Scan each <index> element with a single regex pass over its text
+        # instead of building an element for every <offset>.
+        indices = list(self._index_name_pattern.finditer(text))
+        for i, match in enumerate(indices):
+            stop = indices[i + 1].start() if i + 1 < len(indices) else len(text)
+            entries = self._offset_pattern.findall(text, match.end(), stop)
+            # the pattern has separate groups for double and single quotes
+            id_refs = [id_ref or alt_id_ref for id_ref, alt_id_ref, _ in entries]
+            if has_entities:
+                id_refs = list(map(xml.ByteCountingXMLScanner.replace_entities, id_refs))
+            offsets = list(map(int, map(itemgetter(2), entries)))
+            pairs = zip(id_refs, offsets)
+            # positional access expects the entries in file order
+            if not all(map(le, offsets, offsets[1:])):
+                pairs = sorted(pairs, key=itemgetter(1))
+            index = index_map._inner_type()
+            for id_ref, offset in pairs:
+                index[id_ref] = offset
+            index_map[match.group(2)] = index
         return index_map
 
     @xml._keepstate
-    def _find_index_list_offset(self):
+    def _find_index_list_offset(self, mapped=None):
         """
         Search relative to the bottom of the file upwards to find the offsets
         of the index lists.
 
+        Parameters
+        ----------
+        mapped : mmap.mmap, optional
+            The memory-mapped file. If not given, the file is read directly.
+
         Returns
         -------
         list of int
             A list of byte offsets for `<indexList>` elements
         """
-        self._source.seek(-1024, 2)
-        text = self._source.read(1024)
-        index_offsets = list(map(int, re.findall(br'<indexListOffset>(\d+)</indexListOffset>', text)))
+        if mapped is not None:
+            text = mapped[-self._index_list_offset_search_size:]
+        else:
+            self._source.seek(0, 2)
+            size = self._source.tell()
+            self._source.seek(max(size - self._index_list_offset_search_size, 0))
+            text = self._source.read()
+        index_offsets = list(map(int, self._index_list_offset_pattern.findall(text)))
         return index_offsets
 
     @xml._keepstate
@@ -475,18 +664,23 @@ class PreIndexedMzML(MzML):
         -------
         dict of str -> dict of str -> int
         """
-        offsets = self._find_index_list_offset()
-        index_list = xml.HierarchicalOffsetIndex()
-        for offset in offsets:
-            # Sometimes the offset is at the very beginning of the file,
-            # due to a bug in an older version of ProteoWizard. If this crude
-            # check fails, don't bother searching the entire file, and fall back
-            # on the base class's mechanisms.
-            #
-            # Alternative behavior here would be to start searching for the start
-            # of the index from the bottom of the file, but this version of Proteowizard
-            # also emits invalid offsets which do not improve retrieval time.
-            if offset < 1024:
-                continue
-            index_list = self._iterparse_index_list(offset)
+        mapped = self._map_source()
+        try:
+            offsets = self._find_index_list_offset(mapped)
+            index_list = xml.HierarchicalOffsetIndex()
+            for offset in offsets:
+                # Sometimes the offset is at the very beginning of the file,
+                # due to a bug in an older version of ProteoWizard. If this crude
+                # check fails, don't bother searching the entire file, and fall back
+                # on the base class's mechanisms.
+                #
+                # Alternative behavior here would be to start searching for the start
+                # of the index from the bottom of the file, but this version of Proteowizard
+                # also emits invalid offsets which do not improve retrieval time.
+                if offset < 1024:
+                    continue
+                index_list = self._read_index_list(offset, mapped)
+        finally:
+            if mapped is not None:
+                mapped.close()
         return index_list
@@ -222,7 +222,7 @@ class MzXML(xml.ArrayConversionMixin, aux.TimeOrderedIndexedReaderMixin, xml.Mul
     def _get_time(self, scan):
         return scan['retentionTime']
 
-def read(source, read_schema=False, iterative=True, use_index=False, dtype=None, huge_tree=False):
+def read(source, read_schema=False, iterative=True, use_index=False, dtype=None, huge_tree=False, decode_binary=True):
     """Parse `source` and iterate through spectra.
 
     Parameters
@@ -264,7 +264,7 @@ def read(source, read_schema=False, iterative=True, use_index=False, dtype=None,
     """
 
     return MzXML(source, read_schema=read_schema, iterative=iterative,
-        use_index=use_index, dtype=dtype, huge_tree=huge_tree)
+        use_index=use_index, dtype=dtype, huge_tree=huge_tree, decode_binary=decode_binary)
 
 
 def iterfind(source, path, **kwargs):
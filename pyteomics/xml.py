@@ -371,9 +371,11 @@ class XML(FileReader):
         # return {cvstr(attribs['name'], accession, unit_accesssion): value}
         return _XMLParam(cvstr(attribs['name'], accession, unit_accesssion), value, _local_name(element))
 
+    _immediate_params_xpath = etree.XPath(
+        './*[local-name()="cvParam" or local-name()="userParam" or local-name()="UserParam"]')
+
     def _find_immediate_params(self, element, **kwargs):
-        return element.xpath(
-            './*[local-name()="cvParam" or local-name()="userParam" or local-name()="UserParam"]')
+        return self._immediate_params_xpath(element)
 
     def _insert_param(self, info_dict, param):
         key = param.name
@@ -618,7 +620,7 @@ class XML(FileReader):
         """Clear the element ID cache"""
         self._id_dict = {}
 
-    def _find_by_id_no_reset(self, elem_id, id_key=None):
+    def _find_by_id_no_reset(self, elem_id, id_key=None, tag=None):
         """
         An almost exact copy of :meth:`get_by_id` with the difference that it does
         not reset the file reader's position before iterative parsing.
@@ -627,6 +629,13 @@ class XML(FileReader):
         ----------
         elem_id : str
             The element id to query for
+        id_key : str, optional
+            The name of the XML attribute to use for lookup.
+        tag : str, optional
+            Local name of the element. If given, only elements with this name
+            are checked, which spares creating all other elements in Python.
+            Other elements are not cleared then, so this is meant for the case when
+            the target is expected close to the current position.
 
         Returns
         -------
@@ -635,8 +644,10 @@ class XML(FileReader):
         found = False
         if id_key is None:
             id_key = self._default_id_attr
+        if tag is not None:
+            tag = '{*}' + tag
         for event, elem in etree.iterparse(
-                self._source, events=('start', 'end'), remove_comments=True, huge_tree=self._huge_tree):
+                self._source, events=('start', 'end'), tag=tag, remove_comments=True, huge_tree=self._huge_tree):
             if event == 'start':
                 if elem.attrib.get(id_key) == elem_id:
                     found = True
@@ -835,11 +846,13 @@ class ByteCountingXMLScanner(_file_obj):
                 yield i, match.group(1), dict(attrs.findall(line))
             i += len(line)
 
-    def _entity_sub_cb(self, match):
+    @classmethod
+    def _entity_sub_cb(cls, match):
         ent = match.group(1)
-        return self.entities[ent]
+        return cls.entities[ent]
 
-    def replace_entities(self, key):
+    @classmethod
+    def replace_entities(cls, key):
         '''Replace XML entities in a string with their character representation
 
         Uses the minimal mapping of XML entities pre-defined for all XML documents and
@@ -855,7 +868,7 @@ class ByteCountingXMLScanner(_file_obj):
         -------
         str
         '''
-        return self.xml_entity_pattern.sub(self._entity_sub_cb, key)
+        return cls.xml_entity_pattern.sub(cls._entity_sub_cb, key)
 
     @_keepstate
     def build_byte_index(self, lookup_id_key_mapping=None):
@@ -1100,8 +1113,8 @@ class IndexedXML(IndexedReaderMixin, XML):
             self._source, self._indexed_tags, self._indexed_tag_keys)
 
     @_keepstate
-    def _find_by_id_reset(self, elem_id, id_key=None):
-        return self._find_by_id_no_reset(elem_id, id_key=id_key)
+    def _find_by_id_reset(self, elem_id, id_key=None, tag=None):
+        return self._find_by_id_no_reset(elem_id, id_key=id_key, tag=tag)
 
     @_keepstate
     def get_by_id(self, elem_id, id_key=None, element_type=None, **kwargs):
@@ -1132,8 +1145,9 @@ class IndexedXML(IndexedReaderMixin, XML):
             self._source.seek(offset)
             if id_key is None:
                 id_key = self._indexed_tag_keys.get(element_type)
-            elem = self._find_by_id_no_reset(elem_id, id_key=id_key)
+            elem = self._find_by_id_no_reset(elem_id, id_key=id_key, tag=element_type)
         except (KeyError, AttributeError, etree.LxmlError):
+            # without the tag filter, elements of other types are cleared while scanning
             elem = self._find_by_id_reset(elem_id, id_key=id_key)
         data = self._get_info_smart(elem, **kwargs)
         return data
@@ -1190,6 +1204,10 @@ class ArrayConversionMixin(BinaryDataArrayTransformer):
         elif dtype:
             self._dtype_dict = {k: dtype for k in self._array_keys}
             self._dtype_dict[None] = dtype
+        intensity_dtype = kwargs.pop('intensity_dtype', None)
+        if intensity_dtype is not None:
+            # e.g. np.float32 or np.float16 to store intensities with reduced precision
+            self._dtype_dict['intensity array'] = intensity_dtype
         super(ArrayConversionMixin, self).__init__(*args, **kwargs)
 
     def __getstate__(self):
@@ -1204,7 +1222,7 @@ class ArrayConversionMixin(BinaryDataArrayTransformer):
     def _convert_array(self, k, array):
         dtype = self._dtype_dict.get(k)
         if dtype is not None:
-            return array.astype(dtype)
+            return array.astype(dtype, copy=False)
         return array
 
     def _finalize_record_conversion(self, array, record):
@@ -53,7 +53,9 @@ setup(
                           'graphics': ['matplotlib'],
                           'DF': ['pandas'],
                           'Unimod': ['lxml', 'sqlalchemy'],
-                          'numpress': ['pynumpress']},
+                          'numpress': ['pynumpress'],
+                          'deflate': ['deflate'],
+                          'pybase64': ['pybase64']},
     classifiers        = ['Intended Audience :: Science/Research',
                           'Programming Language :: Python :: 2.7',
                           'Programming Language :: Python :: 3',
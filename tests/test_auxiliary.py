@@ -5,6 +5,8 @@ import operator as op
 import numpy as np
 import pandas as pd
 import tempfile
+import base64
+import zlib
 
 from os import path
 import pyteomics
@@ -869,6 +871,13 @@ class OffsetIndexTest(unittest.TestCase):
     def test_index_sequence(self):
         self.assertEqual(self.index.index_sequence, tuple(self.sequence))
 
+    def test_index_sequence_invalidated(self):
+        self.assertEqual(self.index.index_sequence, tuple(self.sequence))
+        self.index['10'] = 10
+        self.assertEqual(self.index.index_sequence, tuple(self.sequence + [('10', 10)]))
+        self.index.pop('10')
+        self.assertEqual(self.index.index_sequence, tuple(self.sequence))
+
     def test_find(self):
         self.assertEqual(self.index.find('3'), 3)
 
@@ -880,6 +889,20 @@ class OffsetIndexTest(unittest.TestCase):
         self.assertEqual(self.index.from_slice(slice(1, 3)), ['1', '2'])
         self.assertEqual(self.index.from_slice(slice(1, 3), True), self.sequence[1:3])
 
+    def test_sort(self):
+        shuffled = aux.OffsetIndex([self.sequence[i] for i in [3, 1, 0, 2, 9, 8, 4, 6, 5, 7]])
+        self.assertFalse(shuffled._integrity_check())
+        shuffled.sort()
+        self.assertTrue(shuffled._integrity_check())
+        self.assertEqual(shuffled.index_sequence, tuple(self.sequence))
+        self.assertTrue(self.index._integrity_check())
+
+    def test_sort_ranges(self):
+        sequence = [(str(i), (i, i + 1)) for i in range(10)]
+        shuffled = aux.OffsetIndex(sequence[::-1])
+        self.assertFalse(shuffled._integrity_check())
+        self.assertEqual(shuffled.sort().index_sequence, tuple(sequence))
+
     def test_between(self):
         self.assertEqual(self.index.between('1', '3'), ['1', '2', '3'])
         self.assertEqual(self.index.between('1', '3', True), [('1', 1), ('2', 2), ('3', 3)])
@@ -888,6 +911,32 @@ class OffsetIndexTest(unittest.TestCase):
         self.assertEqual(self.index.between('8', None), ['8', '9'])
 
 
+class DecodeBase64Test(unittest.TestCase):
+    def setUp(self):
+        self.array = np.arange(10, dtype=np.float64)
+        self.raw = self.array.tobytes()
+
+    def test_uncompressed(self):
+        source = base64.b64encode(self.raw).decode('ascii')
+        decoded = aux._decode_base64_data_array(source, np.float64, False)
+        self.assertTrue(np.array_equal(decoded, self.array))
+        self.assertTrue(decoded.flags.writeable)
+
+    def test_compressed(self):
+        source = base64.b64encode(zlib.compress(self.raw)).decode('ascii')
+        decoded = aux._decode_base64_data_array(source, np.float64, True)
+        self.assertTrue(np.array_equal(decoded, self.array))
+        self.assertTrue(decoded.flags.writeable)
+
+    def test_skip_checksum(self):
+        from pyteomics.auxiliary.utils import _zlib_decompress
+        compressed = bytearray(zlib.compress(self.raw))
+        compressed[-1] ^= 0xff
+        self.assertRaises(zlib.error, _zlib_decompress, compressed)
+        for size in [None, len(self.raw)]:
+            self.assertEqual(bytes(_zlib_decompress(compressed, size, verify=False)), self.raw)
+
+
 class UseIndexTest(unittest.TestCase):
     class MockFile:
         def __init__(self, seekable, mode):
@@ -206,6 +206,18 @@ class MGFTest(unittest.TestCase):
         self.assertTrue(inst._source.closed)
         shutil.rmtree(test_dir, True)
 
+    def test_index_cache(self):
+        test_dir = tempfile.mkdtemp()
+        work_path = os.path.join(test_dir, self.path)
+        shutil.copy(self.path, work_path)
+        with mgf.IndexedMGF(work_path, use_index_cache=True) as inst:
+            self.assertTrue(inst._check_has_byte_offset_file())
+        with mgf.IndexedMGF(work_path) as inst:
+            inst.build_byte_index = None  # the saved index must be used
+            inst._build_index()
+            self.assertEqual(data.mgf_spectra_long, list(inst))
+        shutil.rmtree(test_dir, True)
+
     def test_write_index_keys(self):
         test_dir = tempfile.mkdtemp()
         work_path = os.path.join(test_dir, self.path)
@@ -15,6 +15,8 @@ import operator as op
 import pynumpress
 import base64
 import zlib
+import re
+import warnings
 
 class MzmlTest(unittest.TestCase):
     maxDiff = None
@@ -69,6 +71,117 @@ class MzmlTest(unittest.TestCase):
             self.assertEqual(record.compression, "zlib compression")
             self.assertEqual(mzml_spectra[1]['intensity array'], record.decode())
 
+    def test_deferred_decoding(self):
+        with read(self.path, decode_binary=False) as reader:
+            for spectrum, expected in zip(reader, mzml_spectra):
+                for key in ['m/z array', 'intensity array']:
+                    record = spectrum[key]
+                    self.assertIsInstance(record, aux.BinaryDataArrayTransformer.binary_array_record)
+                    self.assertTrue(np.allclose(np.asarray(record), expected[key]))
+                    self.assertEqual(np.asarray(record, dtype=np.float32).dtype, np.float32)
+
+    def test_decode_workers(self):
+        for func in [MzML, read]:
+            with func(self.path, decode_workers=2) as reader:
+                self.assertEqual(mzml_spectra, list(reader))
+        dtypes = {'m/z array': np.float32, 'intensity array': np.int32}
+        with MzML(self.path, decode_workers=1, dtype=dtypes) as reader:
+            for spec in reader:
+                for k, v in dtypes.items():
+                    self.assertEqual(spec[k].dtype, v)
+        for path in ['spectrumList', 'run']:
+            with MzML(self.path, decode_workers=2) as reader:
+                result = next(reader.iterfind(path))
+            spectra = result['spectrum'] if path == 'spectrumList' else result['spectrumList']['spectrum']
+            self.assertEqual(mzml_spectra, spectra)
+        with MzML(self.path, decode_workers=2, decode_binary=False) as reader:
+            spectrum = next(reader)
+            self.assertIsInstance(spectrum['m/z array'], aux.BinaryDataArrayTransformer.binary_array_record)
+
+    def test_skip_checksums(self):
+        with MzML(self.path, verify_checksums=False) as reader:
+            self.assertEqual(mzml_spectra, list(reader))
+
+    def test_load_as_arrays(self):
+        with MzML(self.path) as reader:
+            for indices, spectra in [(None, mzml_spectra), ([1], mzml_spectra[1:])]:
+                arrays = reader.load_as_arrays(indices)
+                self.assertEqual(arrays['offsets'].tolist(),
+                    [0] + np.cumsum([s['m/z array'].size for s in spectra]).tolist())
+                for i, spectrum in enumerate(spectra):
+                    start, end = arrays['offsets'][i:i + 2]
+                    for key in ['m/z array', 'intensity array']:
+                        self.assertTrue(np.allclose(arrays[key][start:end], spectrum[key]))
+                    self.assertEqual(arrays['ms level'][i], spectrum['ms level'])
+                    self.assertAlmostEqual(arrays['scan start time'][i], MzML._get_time(spectrum), places=4)
+        with MzML(self.path, decode_binary=False) as reader:
+            self.assertEqual(reader.load_as_arrays()['offsets'].tolist(),
+                [0] + np.cumsum([s['m/z array'].size for s in mzml_spectra]).tolist())
+        with MzML(self.path, dtype=np.float32) as reader:
+            arrays = reader.load_as_arrays()
+            self.assertEqual(arrays['m/z array'].dtype, np.float32)
+            self.assertEqual(arrays['intensity array'].dtype, np.float32)
+            self.assertEqual(reader.load_as_arrays([])['m/z array'].dtype, np.float32)
+            spectrum = dict(mzml_spectra[0])
+            del spectrum['intensity array']
+            reader.iterfind = lambda path: iter([spectrum])
+            self.assertRaises(aux.PyteomicsError, reader.load_as_arrays)
+
+    def test_decode_array_length(self):
+        data = mzml_spectra[1]['intensity array']
+        encoded = base64.b64encode(zlib.compress(data.tobytes())).decode('ascii')
+        transformer = aux.BinaryDataArrayTransformer()
+        for length in [None, data.size, data.size + 10, 1]:
+            array = transformer.decode_data_array(encoded, 'zlib compression', data.dtype, length)
+            self.assertTrue(np.array_equal(data, array))
+        record = transformer._make_record(encoded, 'zlib compression', data.dtype, array_length=data.size)
+        self.assertTrue(np.array_equal(data, record.decode()))
+
+    def test_custom_decompressor(self):
+        data = mzml_spectra[1]['intensity array']
+        encoded = base64.b64encode(zlib.compress(data.tobytes())).decode('ascii')
+        calls = []
+
+        def decompress(source, size=None, verify=True):
+            calls.append((size, verify))
+            return zlib.decompress(source)
+        decompress.accepts_hints = True
+
+        transformer = aux.BinaryDataArrayTransformer()
+        transformer.compression_type_map = dict(transformer.compression_type_map, **{'zlib compression': decompress})
+        transformer.verify_checksums = False
+        array = transformer.decode_data_array(encoded, 'zlib compression', data.dtype, data.size)
+        self.assertTrue(np.array_equal(data, array))
+        self.assertEqual(calls, [(data.nbytes, False)])
+
+    def test_one_argument_decompressor(self):
+        data = mzml_spectra[1]['intensity array']
+        encoded = base64.b64encode(zlib.compress(data.tobytes())).decode('ascii')
+        for decompress in [lambda source: zlib.decompress(source), zlib.decompress]:
+            transformer = aux.BinaryDataArrayTransformer()
+            transformer.compression_type_map = dict(transformer.compression_type_map, **{'zlib compression': decompress})
+            array = transformer.decode_data_array(encoded, 'zlib compression', data.dtype, data.size)
+            self.assertTrue(np.array_equal(data, array))
+
+    def test_array_params_under_name(self):
+        with MzML(self.path) as reader:
+            info = {'name': ['m/z array', 'zlib compression', '64-bit float'], 'binary': ''}
+            self.assertEqual(reader._determine_array_dtype(info), np.float64)
+            self.assertEqual(reader._determine_compression(info), 'zlib compression')
+            self.assertEqual(info['name'], ['m/z array'])
+            info = {'m/z array': '', '32-bit float': '', 'no compression': '', 'binary': ''}
+            self.assertEqual(reader._determine_array_dtype(info), np.float32)
+            self.assertEqual(reader._determine_compression(info), 'no compression')
+            self.assertEqual(info, {'m/z array': '', 'binary': ''})
+            info = {'name': 'zlib compression', 'm/z array': '', '64-bit float': '', 'binary': ''}
+            self.assertEqual(reader._determine_compression(info), 'zlib compression')
+            self.assertEqual(reader._determine_array_dtype(info), np.float64)
+            self.assertEqual(info, {'m/z array': '', 'binary': ''})
+            info = {'name': '64-bit float', 'm/z array': '', 'binary': ''}
+            self.assertEqual(reader._determine_compression(info), 'no compression')
+            self.assertEqual(reader._determine_array_dtype(info), np.float64)
+            self.assertEqual(info, {'m/z array': '', 'binary': ''})
+
     def test_read_dtype(self):
         dtypes = {'m/z array': np.float32, 'intensity array': np.int32}
         with read(self.path, dtype=dtypes) as f:
@@ -76,6 +189,29 @@ class MzmlTest(unittest.TestCase):
                 for k, v in dtypes.items():
                     self.assertEqual(spec[k].dtype, v)
 
+    def test_intensity_dtype(self):
+        with MzML(self.path, dtype=np.float64, intensity_dtype=np.float32) as f:
+            for spec, expected in zip(f, mzml_spectra):
+                self.assertEqual(spec['m/z array'].dtype, np.float64)
+                self.assertEqual(spec['intensity array'].dtype, np.float32)
+                self.assertTrue(np.allclose(spec['intensity array'], expected['intensity array']))
+
+    def test_read_dtype_no_copy(self):
+        with read(self.path, dtype=np.float64) as f:
+            array = next(f)['m/z array']
+            self.assertEqual(array.dtype, np.float64)
+            self.assertTrue(array.flags.writeable)
+            self.assertIsNotNone(array.base)
+
+    def test_find_by_id_tag(self):
+        with MzML(self.path) as reader:
+            elem_id = mzml_spectra[1]['id']
+            self.assertEqual(reader._find_by_id_reset(elem_id, tag='spectrum').get('id'), elem_id)
+            self.assertRaises(KeyError, reader._find_by_id_reset, elem_id, tag='chromatogram')
+            self.assertEqual(reader.get_by_id(elem_id, element_type='spectrum'), mzml_spectra[1])
+            # a failed lookup in the index falls back to a full scan of all elements
+            self.assertEqual(reader.get_by_id(elem_id, element_type='chromatogram'), mzml_spectra[1])
+
     def test_has_built_index(self):
         with read(self.path, use_index=True) as f:
             self.assertGreater(len(f._offset_index), 0)
@@ -117,6 +253,29 @@ class MzmlTest(unittest.TestCase):
         self.assertTrue(inst._source.closed)
         shutil.rmtree(test_dir, True)
 
+    def test_index_cache(self):
+        test_dir = tempfile.mkdtemp()
+        work_path = os.path.join(test_dir, self.path)
+        shutil.copy(self.path, work_path)
+        with MzML(work_path, use_index=True, use_index_cache=True) as inst:
+            self.assertTrue(inst._check_has_byte_offset_file())
+            self.assertFalse(inst._check_byte_offset_file_is_outdated())
+            expected = inst.index['spectrum']
+        with MzML(work_path, use_index=True) as inst:
+            inst._read_byte_offsets()
+            self.assertEqual(inst.index['spectrum'], expected)
+            # an index saved before the last change of the source file is ignored
+            with open(inst._byte_offset_filename, 'w') as fh:
+                xml.HierarchicalOffsetIndex({'spectrum': {}}).save(fh)
+            inst._read_byte_offsets()
+            self.assertEqual(len(inst.index['spectrum']), 0)
+            mtime = os.path.getmtime(work_path)
+            os.utime(inst._byte_offset_filename, (mtime - 10, mtime - 10))
+            self.assertTrue(inst._check_byte_offset_file_is_outdated())
+            inst._build_index()
+            self.assertEqual(inst.index['spectrum'], expected)
+        shutil.rmtree(test_dir, True)
+
     def test_unit_extract(self):
         with MzML(self.path) as handle:
             for scan in handle:
@@ -221,5 +380,88 @@ class MzmlTest(unittest.TestCase):
         self.assertTrue(np.allclose(data, record.decode(), atol=0.6))
 
 
+class PreIndexedMzmlTest(unittest.TestCase):
+    path = 'test.mzML'
+
+    def setUp(self):
+        # test.mzML lists offsets from a bigger file, so rebuild a valid index
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        data = data[:data.index(b'<indexList ')]
+        self.expected = {}
+        chunks = [b'<indexList count="2">\n']
+        for tag in ['spectrum', 'chromatogram']:
+            offsets = {}
+            chunks.append('  <index name="{}">\n'.format(tag).encode())
+            for m in re.finditer(r'<{} [^>]*?id="([^"]*)"'.format(tag).encode(), data):
+                offsets[m.group(1).decode()] = m.start()
+                chunks.append('    <offset idRef="{}">{}</offset>\n'.format(m.group(1).decode(), m.start()).encode())
+            chunks.append(b'  </index>\n')
+            self.expected[tag] = offsets
+        chunks.append(b'</indexList>\n')
+        chunks.append('<indexListOffset>{}</indexListOffset>\n'.format(len(data)).encode())
+        chunks.append(b'<fileChecksum>0</fileChecksum>\n</indexedmzML>\n')
+        self.data = data + b''.join(chunks)
+
+    def test_embedded_index(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            reader = PreIndexedMzML(BytesIO(self.data))
+        with reader:
+            for tag, offsets in self.expected.items():
+                self.assertEqual(dict(reader.index[tag]), offsets)
+            self.assertEqual(mzml_spectra, list(reader))
+            self.assertEqual(mzml_spectra[1], reader.get_by_id('controllerType=0 controllerNumber=1 scan=2'))
+            self.assertEqual(mzml_spectra[1], reader[1])
+            self.assertEqual(mzml_spectra, reader.time[0:0.1])
+
+    def test_embedded_index_file(self):
+        test_dir = tempfile.mkdtemp()
+        work_path = os.path.join(test_dir, self.path)
+        with open(work_path, 'wb') as dest:
+            dest.write(self.data)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            reader = PreIndexedMzML(work_path)
+        with reader:
+            for tag, offsets in self.expected.items():
+                self.assertEqual(dict(reader.index[tag]), offsets)
+            self.assertEqual(mzml_spectra, list(reader))
+        shutil.rmtree(test_dir, True)
+
+    def test_index_list_offset_far_from_end(self):
+        data = self.data.replace(b'<fileChecksum>', b'<!--' + b' ' * 4000 + b'-->\n<fileChecksum>')
+        for source in [BytesIO(data), BytesIO(data[-6000:])]:
+            with PreIndexedMzML(BytesIO(self.data)) as reader:
+                reader._source = source
+                self.assertEqual(reader._find_index_list_offset(), [self.data.index(b'<indexList ')])
+
+    def test_index_list_entities(self):
+        text = (b'<indexList count="1">\n  <index name="spectrum">\n'
+                b'    <offset idRef="a &quot;b&quot; &amp; c">100</offset>\n'
+                b"    <offset idRef='d'>200</offset>\n"
+                b'  </index>\n</indexList>\n')
+        with PreIndexedMzML(BytesIO(self.data)) as reader:
+            index = reader._read_index_list(0, text)
+        self.assertEqual(list(index.keys()), ['spectrum'])
+        self.assertEqual(list(index['spectrum'].items()), [('a "b" & c', 100), ('d', 200)])
+
+    def test_index_list_order(self):
+        text = (b'<indexList count="1">\n  <index name="spectrum">\n'
+                b'    <offset idRef="b">200</offset>\n'
+                b'    <offset idRef="a">100</offset>\n'
+                b'  </index>\n</indexList>\n')
+        with PreIndexedMzML(BytesIO(self.data)) as reader:
+            index = reader._read_index_list(0, text)
+        self.assertEqual(list(index['spectrum'].items()), [('a', 100), ('b', 200)])
+
+    def test_fallback(self):
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            with PreIndexedMzML(self.path) as reader:
+                self.assertEqual(sorted(reader.index['spectrum']), sorted(self.expected['spectrum']))
+        self.assertTrue(any('Could not extract the embedded offset index' in str(x.message) for x in w))
+
+
 if __name__ == '__main__':
     unittest.main()
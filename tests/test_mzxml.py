@@ -37,6 +37,7 @@ class MzXMLTest(unittest.TestCase):
             record = spectrum['m/z array']
             array = record.decode()
             self.assertTrue(np.allclose(array, validation))
+            self.assertTrue(np.allclose(np.asarray(record), validation))
 
     def test_prebuild_index(self):
         test_dir = tempfile.mkdtemp()